@@ -62,19 +62,14 @@ for _ in range(random_samples):
     rand_dist_str = rand_dist_dist + rand_dist_q + rand_dist_seg
     print(f"Random sample point to polygon: \n{rand_dist_str} \n")
 
-vectors = []
-tangent_vectors = []
+# normal and tangent vectors for every point in one batch call, scaled by the distance like MME565.Vector.x and .y
+distance, normals, tangents = polygon.vectors_points_to_polygon(p_q)
+vectors = normals * distance[:, np.newaxis]
+tangent_vectors = tangents * distance[:, np.newaxis]
 
-rand_vectors = []
-rand_tangent_vectors = []
-
-for point in range(len(distances)):
-    vectors.append([distances[point][0][1].vector_point_to_segment(distances[point][1]), distances[point][1]])
-    tangent_vectors.append([distances[point][0][1].tangent_vector_point_to_segment(distances[point][1]), distances[point][1]])
-
-for i, point in enumerate(rand_distances):
-    rand_vectors.append([rand_distances[i][0][1].vector_point_to_segment(rand_distances[i][1]), rand_distances[i][1]])
-    rand_tangent_vectors.append([rand_distances[i][0][1].tangent_vector_point_to_segment(rand_distances[i][1]), rand_distances[i][1]])
+rand_distance, rand_normals, rand_tangents = polygon.vectors_points_to_polygon(p_q_rand)
+rand_vectors = rand_normals * rand_distance[:, np.newaxis]
+rand_tangent_vectors = rand_tangents * rand_distance[:, np.newaxis]
 
 
 # MME565.show_polygon(polygon, p_q)
@@ -95,7 +90,7 @@ for i, point in enumerate(rand_distances):
 #         plt.plot(point.x, point.y, "bo")
 #     else:
 #         plt.plot(point.x, point.y, "rx")
-#         q = ax.quiver(vectors[i][1][0], vectors[i][1][1], vectors[i][0].x, vectors[i][0].y)
+#         q = ax.quiver(p_q[i][0], p_q[i][1], vectors[i, 0], vectors[i, 1])
 #     i += 1
 # plt.axis('equal')
 # plt.tight_layout()
@@ -112,14 +107,15 @@ ax.add_collection(collection)
 i = 0
 if type(p_q[0]) != list:
     q = [p_q]
+inside = polygon.contains_points(p_q)
 for point in p_q:
     if type(point) != MME565.Point:
         point = MME565.Point(point[0], point[1])
-    if polygon.check_point_inside_polygon(point):
+    if inside[i]:
         plt.plot(point.x, point.y, "bo")
     else:
         plt.plot(point.x, point.y, "rx")
-        q = ax.quiver(tangent_vectors[i][1][0],tangent_vectors[i][1][1], tangent_vectors[i][0].x, tangent_vectors[i][0].y)
+        q = ax.quiver(p_q[i][0], p_q[i][1], tangent_vectors[i, 0], tangent_vectors[i, 1])
     i += 1
 plt.axis('equal')
 plt.tight_layout()
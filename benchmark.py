@@ -0,0 +1,186 @@
+# benchmark.py
+
+# Scaling benchmarks for the MME565 geometry and decomposition hot paths
+#
+# python benchmark.py                              run every benchmark at its default sizes
+# python benchmark.py -b trapezoidation -s 4       only trapezoidation, sizes multiplied by 4
+# python benchmark.py -o new.json -c old.json      save the results and compare them to an earlier run
+#
+# Results go to benchmark_results/<date>-<time>.json unless -o is given (benchmark_results/ is ignored by git).
+
+import MME565
+import numpy as np
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+from tests.conftest import obstacle_grid, star_polygon
+
+# default sizes of each benchmark, multiplied by --scale
+SIZES = {
+    "line_construction": [1000, 4000, 16000],
+    "segment_construction": [1000, 4000, 16000],
+    "segment_array_construction": [10000, 100000, 1000000],
+    "distance_point_to_segment": [1000, 4000, 16000],
+    "distance_points_to_segments": [10000, 100000, 1000000],
+    "distance_point_to_polygon": [250, 1000, 4000],
+    "distance_points_to_polygon": [10000, 100000, 1000000],
+    "check_point_inside_polygon": [1000, 4000, 16000],
+    "contains_points": [10000, 100000, 1000000],
+    "polygon_construction": [1000, 10000, 100000],
+    "trapezoidation": [16, 64, 256],
+    "roadmap_queries": [25, 100, 400],
+}
+
+
+def random_points(rng, n, low=0.0, high=100.0):
+    return rng.uniform(low, high, (n, 2))
+
+
+# each benchmark takes (rng, n) and returns the function to time, after doing its setup
+def line_construction(rng, n):
+    ends = random_points(rng, 2 * n).tolist()
+    points = [MME565.Point(x, y) for x, y in ends]
+    return lambda: [MME565.Line(points[2 * i], points[2 * i + 1]) for i in range(n)]
+
+
+def segment_construction(rng, n):
+    ends = random_points(rng, 2 * n).tolist()
+    points = [MME565.Point(x, y) for x, y in ends]
+    return lambda: [MME565.Segment(points[2 * i], points[2 * i + 1]) for i in range(n)]
+
+
+def segment_array_construction(rng, n):
+    p1, p2 = random_points(rng, n), random_points(rng, n)
+    return lambda: MME565.SegmentArray(p1, p2)
+
+
+def distance_point_to_segment(rng, n):
+    segment = MME565.Segment(MME565.Point(20, 30), MME565.Point(70, 60))
+    q = [MME565.Point(x, y) for x, y in random_points(rng, n).tolist()]
+    return lambda: [segment.distance_point_to_segment(point) for point in q]
+
+
+def distance_points_to_segments(rng, n):
+    segments = MME565.SegmentArray(random_points(rng, 16), random_points(rng, 16))
+    q = random_points(rng, n // 16)
+    return lambda: MME565.distance_points_to_segments(q, segments)
+
+
+def distance_point_to_polygon(rng, n):
+    polygon = MME565.Polygon(star_polygon(rng, 32))
+    q = [MME565.Point(x, y) for x, y in random_points(rng, n).tolist()]
+    return lambda: [polygon.distance_point_to_polygon(point) for point in q]
+
+
+def distance_points_to_polygon(rng, n):
+    polygon = MME565.Polygon(star_polygon(rng, 32))
+    q = random_points(rng, n)
+    return lambda: polygon.distance_points_to_polygon(q)
+
+
+def check_point_inside_polygon(rng, n):
+    polygon = MME565.Polygon(star_polygon(rng, 32))
+    q = [MME565.Point(x, y) for x, y in random_points(rng, n).tolist()]
+    return lambda: [polygon.check_point_inside_polygon(point) for point in q]
+
+
+def contains_points(rng, n):
+    polygon = MME565.Polygon(star_polygon(rng, 32))
+    q = random_points(rng, n)
+    return lambda: polygon.contains_points(q)
+
+
+def polygon_construction(rng, n):
+    vertices = star_polygon(rng, n)
+
+    def run():
+        polygon = MME565.Polygon(vertices)
+        return polygon.vertex_types, polygon.segment_array
+    return run
+
+
+def trapezoidation(rng, n):
+    workspace, obstacles = obstacle_grid(rng, n)
+    return lambda: MME565.trapezoidation(workspace, obstacles)
+
+
+def roadmap_queries(rng, n):
+    # 1000 start/goal queries between random free points, on the roadmap of a map with n obstacles
+    workspace, obstacles = obstacle_grid(rng, n)
+    roadmap = MME565.Roadmap(MME565.trapezoidation(workspace, obstacles))
+    (x0, y0), (x1, y1) = workspace.bounding_box
+    q = rng.uniform([x0, y0], [x1, y1], (4000, 2))
+    q = q[MME565.points_in_free_space(q, workspace, obstacles)][:2000].reshape(-1, 2, 2)
+    return lambda: [roadmap.shortest_path(start, goal) for start, goal in q]
+
+
+BENCHMARKS = {name: globals()[name] for name in SIZES}
+
+
+def measure(name, n, seed, repeat):
+    """Best time of repeat runs, then one more run under tracemalloc for the peak memory"""
+    rng = np.random.default_rng(seed)
+    run = BENCHMARKS[name](rng, n)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"name": name, "n": n, "seconds": min(times), "peak_bytes": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmarks for MME565")
+    parser.add_argument("-b", "--benchmark", action="append", choices=list(SIZES), help="benchmark to run (repeatable)")
+    parser.add_argument("-s", "--scale", type=float, default=1.0, help="multiplier of the default sizes")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs per size, the best one is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="JSON file the results are written to")
+    parser.add_argument("-c", "--compare", help="JSON file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {(result["name"], result["n"]): result for result in json.load(f)["results"]}
+
+    results = []
+    print(f"{'benchmark':<30}{'n':>10}{'seconds':>12}{'peak MB':>10}{'ratio':>8}")
+    for name in args.benchmark or list(SIZES):
+        for size in SIZES[name]:
+            result = measure(name, max(1, int(size * args.scale)), args.seed, args.repeat)
+            results.append(result)
+            old = previous.get((name, result["n"]))
+            ratio = f"{result['seconds'] / old['seconds']:.2f}" if old else ""
+            print(f"{name:<30}{result['n']:>10}{result['seconds']:>12.4f}{result['peak_bytes'] / 2**20:>10.2f}{ratio:>8}")
+
+    output = args.output or os.path.join("benchmark_results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "seed": args.seed,
+                "scale": args.scale,
+                "repeat": args.repeat,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# geometry_service.py
+
+# Local geometry query service for MME565 workspaces
+#
+# python geometry_service.py map.bin --port 8765          serve a map saved with MME565.MapFile.save over TCP
+# python geometry_service.py map.bin --unix /tmp/mme565   or over a Unix socket
+#
+# The workspace is loaded once and shared by every client. Requests and replies are newline delimited JSON:
+#   {"id": 1, "op": "distance", "points": [[x, y], ...]}  ->  {"id": 1, "distance": [...], "polygon": [...], "edge": [...]}
+#   {"id": 2, "op": "contains", "points": [[x, y], ...]}  ->  {"id": 2, "free": [...]}
+#   {"id": 3, "op": "nearest_edge", "points": [[x, y]]}   ->  {"id": 3, "distance": [...], "polygon": [...], "edge": [...],
+#                                                              "closest": [[x, y], ...]}
+#   {"id": 4, "op": "stats"}                              ->  {"id": 4, "stats": {op: latency percentiles, batch sizes}}
+# Errors are returned as {"id": ..., "error": "..."}. Concurrent requests of one op are gathered into a micro-batch and
+# answered by one vectorized MME565 call.
+
+import MME565
+import numpy as np
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+
+class MicroBatcher:
+    """
+    Gathers the point arrays submitted concurrently to one vectorized function into batches. A batch is closed once it
+    holds max_points points or max_delay seconds after its first request, whichever comes first, then run in a worker
+    thread so the event loop keeps accepting requests meanwhile. function takes an (N, 2) array and returns a tuple of
+    arrays with N rows, which are split back per request.
+    """
+    def __init__(self, function, max_points: int = 65536, max_delay: float = 0.002, history: int = 10000):
+        self.function = function
+        self.max_points = max_points
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.latencies = collections.deque(maxlen=history)
+        self.batch_sizes = collections.deque(maxlen=history)
+        self._task = None
+
+    async def submit(self, points):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((np.asarray(points, dtype=float).reshape(-1, 2), future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_delay
+            while size < self.max_points:
+                timeout = deadline - loop.time()
+                if timeout <= 0 and self.queue.empty():
+                    break
+                try:
+                    item = self.queue.get_nowait() if self.queue.qsize() else await asyncio.wait_for(
+                        self.queue.get(), max(timeout, 0)
+                    )
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            try:
+                results = await loop.run_in_executor(None, self.function, np.concatenate([item[0] for item in batch]))
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            start = 0
+            now = time.perf_counter()
+            for points, future, submitted in batch:
+                stop = start + len(points)
+                if not future.done():
+                    future.set_result(tuple(result[start:stop] for result in results))
+                self.latencies.append(now - submitted)
+                start = stop
+            self.batch_sizes.append(len(batch))
+
+    def stats(self):
+        """Request count, latency percentiles (seconds) and mean requests per batch over the recent history"""
+        if not self.latencies:
+            return {"requests": 0}
+        p50, p90, p99 = np.percentile(self.latencies, [50, 90, 99])
+        return {
+            "requests": len(self.latencies),
+            "p50": p50,
+            "p90": p90,
+            "p99": p99,
+            "max": max(self.latencies),
+            "mean_batch": float(np.mean(self.batch_sizes)),
+        }
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+class GeometryService:
+    """Serves distance, containment and nearest edge queries of one workspace and its obstacles"""
+    def __init__(self, workspace: MME565.Polygon, obstacles: list, chunk_size: int = 4096, **batch_options):
+        self.workspace = workspace
+        self.obstacles = list(obstacles)
+        self.polygons = [workspace] + self.obstacles
+        self.chunk_size = chunk_size
+        self.batchers = {
+            "distance": MicroBatcher(self._distance, **batch_options),
+            "contains": MicroBatcher(self._contains, **batch_options),
+            "nearest_edge": MicroBatcher(self._nearest_edge, **batch_options),
+        }
+
+    @classmethod
+    def from_map(cls, file, **options):
+        """Service of a map saved with MME565.MapFile.save"""
+        map_file = MME565.MapFile(file)
+        return cls(map_file.workspace, map_file.obstacles, **options)
+
+    def _distance(self, q):
+        distance, polygon, edge, _ = MME565.distance_points_to_polygons(q, self.polygons, self.chunk_size)
+        return distance, polygon, edge
+
+    def _contains(self, q):
+        return (MME565.points_in_free_space(q, self.workspace, self.obstacles, self.chunk_size),)
+
+    def _nearest_edge(self, q):
+        return MME565.distance_points_to_polygons(q, self.polygons, self.chunk_size)
+
+    @staticmethod
+    def _points(request: dict):
+        """The (N, 2) array of request["points"], raising an exception naming the field and what is wrong with it"""
+        if "points" not in request:
+            raise Exception(f"Missing field 'points' for op {request['op']!r}")
+        try:
+            points = np.asarray(request["points"], dtype=float)
+        except (TypeError, ValueError):
+            raise Exception("Field 'points' must be a list of [x, y] pairs of numbers")
+        if points.size == 0:
+            return points.reshape(0, 2)
+        if points.ndim != 2 or points.shape[1] != 2:
+            raise Exception(f"Field 'points' must be a list of [x, y] pairs, got an array of shape {points.shape}")
+        finite = np.isfinite(points).all(axis=1)
+        if not finite.all():
+            raise Exception(f"Field 'points' has non-finite coordinates at index {int(np.argmin(finite))}")
+        return points
+
+    async def handle(self, request: dict):
+        if not isinstance(request, dict):
+            raise Exception(f"Request must be a JSON object, got {type(request).__name__}")
+        if "op" not in request:
+            raise Exception("Missing field 'op'")
+        op = request["op"]
+        if op == "stats":
+            return {"stats": {name: batcher.stats() for name, batcher in self.batchers.items()}}
+        if op not in self.batchers:
+            raise Exception(f"Field 'op' has unknown value {op!r}. Must be one of {sorted(self.batchers) + ['stats']}")
+        results = await self.batchers[op].submit(self._points(request))
+        if op == "contains":
+            return {"free": results[0].tolist()}
+        reply = {"distance": results[0].tolist(), "polygon": results[1].tolist(), "edge": results[2].tolist()}
+        if op == "nearest_edge":
+            reply["closest"] = results[3].tolist()
+        return reply
+
+    async def _reply(self, line: bytes, writer, lock):
+        request = {}
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                raise Exception(f"Request is not valid JSON: {error}")
+            reply = await self.handle(request)
+        except Exception as error:
+            reply = {"error": str(error)}
+        reply["id"] = request.get("id") if isinstance(request, dict) else None
+        async with lock:
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+
+    async def _connection(self, reader, writer):
+        # requests of one connection are answered concurrently, so they can share batches with each other
+        lock = asyncio.Lock()
+        pending = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self._reply(line, writer, lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, unix: str = None):
+        """Starts listening on a Unix socket when unix is given, otherwise on host:port. Returns the asyncio server"""
+        if unix is not None:
+            return await asyncio.start_unix_server(self._connection, unix, limit=2**26)
+        return await asyncio.start_server(self._connection, host, port, limit=2**26)
+
+    def close(self):
+        for batcher in self.batchers.values():
+            batcher.close()
+
+
+class GeometryClient:
+    """asyncio client of a GeometryService. Requests may be issued concurrently from several tasks"""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._next_id = 0
+        self._pending = {}
+        self._listener = asyncio.create_task(self._listen())
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 8765, unix: str = None):
+        if unix is not None:
+            reader, writer = await asyncio.open_unix_connection(unix, limit=2**26)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=2**26)
+        return cls(reader, writer)
+
+    async def _listen(self):
+        while line := await self.reader.readline():
+            reply = json.loads(line)
+            future = self._pending.pop(reply.pop("id"), None)
+            if future is None or future.done():
+                continue
+            if "error" in reply:
+                future.set_exception(Exception(reply["error"]))
+            else:
+                future.set_result(reply)
+        for future in self._pending.values():
+            future.set_exception(ConnectionError("MME565 geometry service closed the connection"))
+
+    async def request(self, op: str, points=None):
+        self._next_id += 1
+        request = {"id": self._next_id, "op": op}
+        if points is not None:
+            request["points"] = np.asarray(points, dtype=float).reshape(-1, 2).tolist()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def distance(self, points):
+        return await self.request("distance", points)
+
+    async def contains(self, points):
+        return await self.request("contains", points)
+
+    async def nearest_edge(self, points):
+        return await self.request("nearest_edge", points)
+
+    async def stats(self):
+        return (await self.request("stats"))["stats"]
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._listener.cancel()
+
+
+async def serve(args):
+    service = GeometryService.from_map(args.map, max_points=args.max_points, max_delay=args.max_delay)
+    server = await service.start(args.host, args.port, args.unix)
+    print(f"serving {args.map} on {args.unix or f'{args.host}:{args.port}'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local geometry query service for a MME565 map")
+    parser.add_argument("map", help="file written by MME565.MapFile.save")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix socket path, used instead of TCP")
+    parser.add_argument("--max-points", type=int, default=65536, help="largest micro-batch in points")
+    parser.add_argument("--max-delay", type=float, default=0.002, help="longest wait for a micro-batch to fill, seconds")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
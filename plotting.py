@@ -0,0 +1,139 @@
+# plotting.py
+
+# Fast plotting of MME565 workspaces, vertex types, vector fields and trapezoid decompositions
+#
+# Every layer is a single matplotlib artist (one PolyCollection, scatter or quiver), so drawing cost does not grow with
+# the number of Python calls. figure() builds a figure on the Agg canvas without pyplot, for headless export with
+# save(); the same functions draw on any pyplot Axes as well.
+
+import MME565
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.animation import FuncAnimation
+
+WORKSPACE_STYLE = {"facecolor": "white", "edgecolor": "black", "linewidth": 1.0}
+OBSTACLE_STYLE = {"facecolor": "0.6", "edgecolor": "black", "linewidth": 1.0}
+TRAPEZOID_STYLE = {"facecolor": "tab:blue", "edgecolor": "tab:blue", "linewidth": 0.5, "alpha": 0.3}
+VERTEX_TYPE_COLORS = dict(zip(MME565.VERTEX_TYPES, ["tab:red", "tab:orange", "tab:green", "tab:purple", "tab:blue",
+                                                    "tab:brown"]))
+
+
+def figure(workspace: MME565.Polygon = None, size: tuple = (8, 6), dpi: int = 100):
+    """Figure and Axes on the Agg canvas (no pyplot, no display needed), limited to the workspace if given"""
+    fig = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_aspect("equal")
+    if workspace is not None:
+        (x0, y0), (x1, y1) = workspace.bounding_box
+        margin = 0.02 * max(x1 - x0, y1 - y0)
+        ax.set_xlim(x0 - margin, x1 + margin)
+        ax.set_ylim(y0 - margin, y1 + margin)
+    return fig, ax
+
+
+def save(fig, file, **kwargs):
+    """Writes a figure to file, the format (PNG, SVG, PDF, ...) follows the extension"""
+    fig.savefig(file, bbox_inches="tight", **kwargs)
+
+
+def polygons_collection(polygons: list, **style):
+    """One PolyCollection of the vertex arrays of Polygon or Trapezoid objects"""
+    return PolyCollection([polygon.vertex_array for polygon in polygons], **style)
+
+
+def plot_workspace(ax, workspace: MME565.Polygon, obstacles: list = ()):
+    """Workspace and obstacles as two PolyCollection layers. Returns both collections"""
+    workspace_layer = ax.add_collection(polygons_collection([workspace], zorder=0, **WORKSPACE_STYLE))
+    obstacle_layer = ax.add_collection(polygons_collection(obstacles, zorder=1, **OBSTACLE_STYLE))
+    ax.autoscale_view()
+    return workspace_layer, obstacle_layer
+
+
+def plot_trapezoids(ax, trapezoids: list, labels: bool = False, **style):
+    """Trapezoids as one PolyCollection and their centers as one scatter, optionally labelled T0, T1, ..."""
+    layer = ax.add_collection(polygons_collection(trapezoids, zorder=2, **{**TRAPEZOID_STYLE, **style}))
+    centers = np.array([trapezoid.center_cartesian for trapezoid in trapezoids], dtype=float).reshape(-1, 2)
+    points = ax.scatter(centers[:, 0], centers[:, 1], s=4, color=layer.get_edgecolor()[:1], zorder=3)
+    if labels:
+        for i, center in enumerate(centers.tolist()):
+            ax.text(center[0], center[1], f"T{i}", fontsize=7, ha="center", va="center", zorder=4)
+    return layer, points
+
+
+def plot_vertex_types(ax, polygons: list, labels: bool = False, size: float = 20, convex: bool = False):
+    """
+    Vertices of the polygons colored by their LRPK type, or by convexity with convex=True, in one scatter with a legend.
+    labels=True also writes the type (or convex / non-convex) next to each vertex.
+    """
+    xy = np.concatenate([polygon.vertex_array for polygon in polygons])
+    if convex:
+        is_convex = np.concatenate([polygon.vertex_convex for polygon in polygons])
+        colors = np.where(is_convex, "tab:green", "tab:red")
+        names = np.where(is_convex, "convex", "non-convex")
+        legend = {"convex": "tab:green", "non-convex": "tab:red"}
+    else:
+        names = np.concatenate([polygon.vertex_types for polygon in polygons])
+        colors = np.array([VERTEX_TYPE_COLORS[t] for t in names.tolist()])
+        legend = {t: VERTEX_TYPE_COLORS[t] for t in MME565.VERTEX_TYPES if t in set(names.tolist())}
+    if labels:
+        for (x, y), name in zip(xy.tolist(), names.tolist()):
+            ax.text(x, y, f" {name}", fontsize=7, va="bottom")
+    points = ax.scatter(xy[:, 0], xy[:, 1], s=size, c=colors, zorder=5)
+    for name, color in legend.items():
+        ax.scatter([], [], s=size, c=color, label=name)
+    ax.legend(loc="best", fontsize=7)
+    return points
+
+
+def plot_points(ax, q, inside, size: float = 6):
+    """(N, 2) query points in one scatter, blue when inside is True and red otherwise"""
+    q = np.asarray(q, dtype=float).reshape(-1, 2)
+    return ax.scatter(q[:, 0], q[:, 1], s=size, c=np.where(inside, "tab:blue", "tab:red"), zorder=6)
+
+
+def plot_vector_field(ax, q, vectors, mask=None, **kwargs):
+    """One quiver of (N, 2) vectors at the (N, 2) points q, only where mask is True if given"""
+    q = np.asarray(q, dtype=float).reshape(-1, 2)
+    vectors = np.asarray(vectors, dtype=float).reshape(-1, 2)
+    if mask is not None:
+        q, vectors = q[mask], vectors[mask]
+    return ax.quiver(q[:, 0], q[:, 1], vectors[:, 0], vectors[:, 1], zorder=7, **kwargs)
+
+
+class SweepAnimation:
+    """
+    Animated trapezoidation sweep. The decomposition is run once with a callback recording each event, then every frame
+    moves the sweep line to the next event and extends the trapezoid PolyCollection with the trapezoids closed there.
+    Only those two artists change, so the animation blits them over a cached background of the workspace.
+    """
+    def __init__(self, workspace: MME565.Polygon, obstacles: list, size: tuple = (8, 6), dpi: int = 100):
+        events = []
+        self.trapezoids = MME565.trapezoidation(workspace, obstacles, callback=events.append)
+        self.x = [event["x"] for event in events]
+        self.closed = np.cumsum([event["closed"] for event in events]).tolist()
+
+        self.fig, self.ax = figure(workspace, size, dpi)
+        plot_workspace(self.ax, workspace, obstacles)
+        (_, y0), (_, y1) = workspace.bounding_box
+        self.line = self.ax.plot([self.x[0]] * 2, [y0, y1], color="tab:red", linewidth=1, animated=True, zorder=8)[0]
+        self.layer = self.ax.add_collection(PolyCollection([], animated=True, zorder=2, **TRAPEZOID_STYLE))
+        self._vertex_arrays = [trapezoid.vertex_array for trapezoid in self.trapezoids]
+        self.animation = FuncAnimation(
+            self.fig, self._frame, frames=len(self.x), init_func=self._start, blit=True, interval=100
+        )
+
+    def _start(self):
+        self.layer.set_verts([])
+        return self.line, self.layer
+
+    def _frame(self, i: int):
+        self.line.set_xdata([self.x[i]] * 2)
+        self.layer.set_verts(self._vertex_arrays[:self.closed[i]])
+        return self.line, self.layer
+
+    def save(self, file, fps: int = 10, **kwargs):
+        """Writes the animation, e.g. to a .gif (pillow) or .mp4 (ffmpeg) file"""
+        self.animation.save(file, fps=fps, **kwargs)
@@ -0,0 +1,55 @@
+# conftest.py
+
+# Tests run against the MME565 module and scripts in the repository root
+#
+# The random maps the tests are built on are defined here and handed to the tests as fixtures; benchmark.py imports the
+# same generators for its workloads.
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MME565  # noqa: E402
+
+
+def star_polygon(rng, n, center=(50.0, 50.0), radius=40.0):
+    """Star shaped polygon with n vertices, so about half of them are non-convex"""
+    angles = np.sort(rng.uniform(0, 2 * np.pi, n))
+    radii = radius * rng.uniform(0.5, 1.0, n)
+    return np.column_stack([center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)])
+
+
+def obstacle_grid(rng, n):
+    """Workspace with about n small triangular obstacles on a jittered grid, none of them overlapping"""
+    side = int(np.ceil(np.sqrt(n)))
+    workspace = MME565.Polygon([[0, 0], [10 * side, 0], [10 * side, 10 * side], [0, 10 * side]])
+    obstacles = []
+    for k in range(n):
+        x, y = 10 * (k % side) + 2 + 3 * rng.random(), 10 * (k // side) + 2 + 3 * rng.random()
+        obstacles.append(MME565.Polygon([[x, y], [x + 3 + rng.random(), y + rng.random()], [x + 1.5, y + 3]]))
+    return workspace, obstacles
+
+
+def box_points(rng, polygon, n, margin: float = 0.0):
+    """n uniform random points in the bounding box of a polygon, widened by margin on every side"""
+    (x0, y0), (x1, y1) = polygon.bounding_box
+    return rng.uniform([x0 - margin, y0 - margin], [x1 + margin, y1 + margin], (n, 2))
+
+
+@pytest.fixture(name="star_polygon")
+def star_polygon_fixture():
+    return star_polygon
+
+
+@pytest.fixture(name="obstacle_grid")
+def obstacle_grid_fixture():
+    return obstacle_grid
+
+
+@pytest.fixture(name="box_points")
+def box_points_fixture():
+    return box_points
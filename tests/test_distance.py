@@ -0,0 +1,50 @@
+# test_distance.py
+
+# Point to segment distances against the exact distance to the clamped orthogonal projection
+
+import MME565
+import numpy as np
+import pytest
+
+
+def clamped_projection(q, p1, p2):
+    """Distance, w and closest point of each point q[i] to the segment p1[i] p2[i], by the clamped projection"""
+    d = p2 - p1
+    t = np.sum((q - p1) * d, axis=-1) / np.sum(d * d, axis=-1)
+    closest = p1 + np.clip(t, 0, 1)[:, np.newaxis] * d
+    return np.hypot(*(q - closest).T), np.where(t < 0, 1, np.where(t > 1, 2, 0)), t
+
+
+def random_pairs(rng, n):
+    """Points and segments on an 8 decimal grid, a quarter of the segments horizontal or vertical"""
+    q, p1, p2 = (np.round(rng.uniform(0, 100, (n, 2)), 8) for _ in range(3))
+    p2[: n // 8, 1] = p1[: n // 8, 1]
+    p2[n // 8: n // 4, 0] = p1[n // 8: n // 4, 0]
+    return q, p1, p2
+
+
+@pytest.mark.parametrize("mode", ["round", "epsilon"])
+def test_random_pairs(mode):
+    q, p1, p2 = random_pairs(np.random.default_rng(0), 4000)
+    expected, expected_w, t = clamped_projection(q, p1, p2)
+    clear = (np.abs(t) > 1e-6) & (np.abs(t - 1) > 1e-6)  # w is only pinned down away from the ends
+    with MME565.geometry_mode(mode):
+        distance, w, closest = MME565._distance_points_to_segments(q, p1, p2)
+        assert np.allclose(distance, expected, rtol=0, atol=1e-7)
+        assert np.array_equal(w[clear], expected_w[clear])
+        assert np.allclose(np.hypot(*(q - closest).T), expected, rtol=0, atol=1e-7)
+        for i in range(0, len(q), 10):
+            d, w_i, point = MME565.Segment(p1[i], p2[i]).distance_point_to_segment(q[i])
+            assert abs(d - expected[i]) < 1e-7
+            assert not clear[i] or w_i == expected_w[i]
+            assert abs(np.hypot(q[i, 0] - point.x, q[i, 1] - point.y) - expected[i]) < 1e-7
+
+
+def test_interior_projection():
+    # the rounded sum of the distances to the ends once put this projection (t = 0.536) off the segment
+    segment = MME565.Segment([47.60978106, 75.06646226], [45.4731835, 77.33256732])
+    q = [46.29437681, 76.11902894]
+    distance, w, _ = segment.distance_point_to_segment(q)
+    assert w == 0 and abs(distance - 0.23500606) < 1e-7
+    distance, w, _ = segment.distance_points_to_segment(np.array([q]))
+    assert w[0] == 0 and abs(distance[0] - 0.23500606) < 1e-7
@@ -0,0 +1,37 @@
+# test_distance_field.py
+
+# DistanceField grid values against the exact signed distance at the grid nodes, and its save and load round trip
+
+import MME565
+import numpy as np
+
+
+def exact_signed_distance(q, workspace, obstacles):
+    """Clamped projection distance to every segment of every polygon, negative outside the free space"""
+    polygons = [workspace] + list(obstacles)
+    p1 = np.concatenate([polygon.segment_array.p1 for polygon in polygons])
+    p2 = np.concatenate([polygon.segment_array.p2 for polygon in polygons])
+    d = p2 - p1
+    t = np.clip(np.sum((q[:, np.newaxis] - p1) * d, axis=-1) / np.sum(d * d, axis=-1), 0, 1)
+    distance = np.hypot(*np.moveaxis(q[:, np.newaxis] - p1 - t[..., np.newaxis] * d, -1, 0)).min(axis=1)
+    return np.where(MME565.points_in_free_space(q, workspace, obstacles), distance, -distance)
+
+
+def test_grid_and_lookup(obstacle_grid, box_points, tmp_path):
+    rng = np.random.default_rng(0)
+    workspace, obstacles = obstacle_grid(rng, 16)
+    field = MME565.DistanceField(workspace, obstacles, 0.5, chunk_size=100)
+    ny, nx = field.distance_grid.shape
+    xs = field.origin[0] + field.resolution * np.arange(nx)
+    ys = field.origin[1] + field.resolution * np.arange(ny)
+    nodes = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+    expected = exact_signed_distance(nodes, workspace, obstacles)
+    assert np.allclose(field.distance_grid.ravel(), expected, rtol=0, atol=1e-7)
+
+    q = box_points(rng, workspace, 2000)
+    assert np.all(np.abs(field.distance(q) - exact_signed_distance(q, workspace, obstacles)) <= field.error_bound)
+
+    field.save(tmp_path / "field.npz")
+    loaded = MME565.DistanceField.load(tmp_path / "field.npz")
+    assert np.array_equal(loaded.distance(q), field.distance(q))
+    assert np.array_equal(loaded.gradient(q), field.gradient(q))
@@ -0,0 +1,113 @@
+# test_geometry_mode.py
+
+# The epsilon geometry mode and the exact orientation fallback, against Fraction arithmetic
+
+import MME565
+import numpy as np
+import pytest
+from fractions import Fraction
+
+
+def exact_orientation(p, q, r):
+    (px, py), (qx, qy), (rx, ry) = [(Fraction(x), Fraction(y)) for x, y in (p, q, r)]
+    det = (qx - px) * (ry - py) - (qy - py) * (rx - px)
+    return (det > 0) - (det < 0)
+
+
+def test_near_degenerate_orientations():
+    # p walks a 64 x 64 grid of float neighbors of (0.5, 0.5), nearly on the line through q and r, where the plain
+    # floating point determinant gets the sign wrong
+    q, r = (12.0, 12.0), (24.0, 24.0)
+    p = [(0.5 + i * 2.0**-53, 0.5 + j * 2.0**-53) for i in range(64) for j in range(64)]
+    expected = [exact_orientation(point, q, r) for point in p]
+    naive = [int(np.sign((q[0] - x) * (r[1] - y) - (q[1] - y) * (r[0] - x))) for x, y in p]
+    assert naive != expected
+    assert [MME565.orientation(point, q, r) for point in p] == expected
+    assert MME565.orientations(p, np.tile(q, (len(p), 1)), np.tile(r, (len(p), 1))).tolist() == expected
+    assert set(expected) == {-1, 0, 1}
+
+
+def test_on_segment_tolerance():
+    segment = ([0.0, 0.0], [1.0, 0.0])
+    with MME565.geometry_mode("epsilon"):
+        s = MME565.Segment(*segment)
+        assert s.distance_point_to_segment([0.5, 3e-9])[0] == pytest.approx(3e-9)
+        assert s.distance_point_to_segment([1 + 0.5e-9, 0.0])[1] == 0
+        assert s.distance_point_to_segment([1 + 2e-9, 0.0])[1] == 2
+        assert s.distance_point_to_segment([-2e-9, 0.0])[1] == 1
+        assert MME565.point_on_segment([0.5, 0.5e-9], *segment, MME565.TOLERANCE)
+        assert not MME565.point_on_segment([0.5, 2e-9], *segment, MME565.TOLERANCE)
+    with MME565.geometry_mode("epsilon", 1e-6):
+        s = MME565.Segment(*segment)
+        assert s.distance_point_to_segment([1 + 5e-7, 0.0])[1] == 0
+        assert MME565.distance_points_to_segments([[1 + 5e-7, 0.0], [1 + 2e-6, 0.0]], [s])[1][:, 0].tolist() == [0, 2]
+
+    # round mode stores coordinates to 8 decimals, so the point 3e-9 off the segment is on it
+    s = MME565.Segment(*segment)
+    assert s.distance_point_to_segment([0.5, 3e-9])[:2] == (0, 0)
+    assert s.distance_point_to_segment([1 + 0.5e-9, 0.0])[1] == 0
+    assert MME565.point_on_segment([0.5, 0.0], *segment)
+    assert not MME565.point_on_segment([0.5, 1e-300], *segment)
+
+
+def near_coincident_map():
+    # the top edge of the lower obstacle runs 1e-12 below the slanted edge of the upper one
+    workspace = MME565.Polygon([[0, 0], [10, 0], [10, 10], [0, 10]])
+    upper = MME565.Polygon([[2, 2], [8, 5], [2, 5]])
+    lower = MME565.Polygon([[3, 2.5 - 1e-12], [8, 5 - 1e-12], [8, 2]])
+    return workspace, [upper, lower]
+
+
+def sorted_cells(trapezoids):
+    cells = MME565.trapezoid_cells(trapezoids)
+    return cells[np.lexsort(cells.T[::-1])]
+
+
+def test_near_coincident_edges_are_deterministic(box_points, monkeypatch):
+    calls = []
+    exact_compare = MME565._ActiveEdges._exact_compare
+    monkeypatch.setattr(MME565._ActiveEdges, "_exact_compare", lambda *args: calls.append(1) or exact_compare(*args))
+    with MME565.geometry_mode("epsilon"):
+        workspace, obstacles = near_coincident_map()
+        trapezoids = MME565.trapezoidation(workspace, obstacles)
+        assert calls  # the edges were too close to order in floating point
+        free_area = workspace.area - sum(obstacle.area for obstacle in obstacles)
+        assert np.isclose(sum(trapezoid.area for trapezoid in trapezoids), free_area, rtol=0, atol=1e-9)
+        assert all(trapezoid.area > 0 for trapezoid in trapezoids)
+        q = box_points(np.random.default_rng(0), workspace, 2000)
+        assert np.array_equal(
+            MME565.TrapezoidLocator(trapezoids).locate(q) >= 0, MME565.points_in_free_space(q, workspace, obstacles)
+        )
+        for permutation in [obstacles, obstacles[::-1], obstacles]:
+            assert np.array_equal(sorted_cells(MME565.trapezoidation(workspace, permutation)), sorted_cells(trapezoids))
+
+
+def test_switching_back_restores_round_mode(obstacle_grid):
+    workspace, obstacles = obstacle_grid(np.random.default_rng(0), 9)
+    q = np.random.default_rng(1).uniform(0, 30, (500, 2))
+    before = (
+        MME565.Point(0.123456789123, 1 / 3).cartesian,
+        MME565.distance_points_to_polygons(q, [workspace] + obstacles),
+        MME565.trapezoid_cells(MME565.trapezoidation(workspace, obstacles)),
+    )
+    with pytest.raises(ZeroDivisionError):
+        with MME565.geometry_mode("epsilon", 1e-6):
+            assert (MME565.GEOMETRY_MODE, MME565.TOLERANCE) == ("epsilon", 1e-6)
+            assert MME565.Point(0.123456789123, 0).x == 0.123456789123
+            1 / 0
+    assert (MME565.GEOMETRY_MODE, MME565.TOLERANCE) == ("round", 1e-9)
+    after = (
+        MME565.Point(0.123456789123, 1 / 3).cartesian,
+        MME565.distance_points_to_polygons(q, [workspace] + obstacles),
+        MME565.trapezoid_cells(MME565.trapezoidation(workspace, obstacles)),
+    )
+    assert before[0] == after[0] == [0.12345679, 0.33333333]
+    for a, b in zip(before[1], after[1]):
+        assert np.array_equal(a, b)
+    assert np.array_equal(before[2], after[2])
+
+    assert MME565.set_geometry_mode("epsilon") == ("round", 1e-9)
+    assert MME565.set_geometry_mode() == ("epsilon", 1e-9)
+    with pytest.raises(Exception, match="Unknown geometry mode"):
+        MME565.set_geometry_mode("exact")
+    assert MME565.GEOMETRY_MODE == "round"
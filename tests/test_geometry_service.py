@@ -0,0 +1,80 @@
+# test_geometry_service.py
+
+# GeometryService over a local TCP socket: batched replies against the direct MME565 queries, and request errors
+
+import MME565
+import numpy as np
+import asyncio
+import contextlib
+import json
+from geometry_service import GeometryClient, GeometryService
+
+
+async def serve(workspace, obstacles, test):
+    service = GeometryService(workspace, obstacles, max_delay=0.01)
+    server = await service.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    client = await GeometryClient.connect(port=port)
+    try:
+        return await test(service, client, port)
+    finally:
+        client.writer.close()
+        client._listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await client._listener
+        service.close()
+        server.close()
+        await server.wait_closed()
+
+
+def test_batched_requests(obstacle_grid, box_points):
+    rng = np.random.default_rng(0)
+    workspace, obstacles = obstacle_grid(rng, 16)
+    shards = [box_points(rng, workspace, n) for n in [1, 50, 300, 7, 120]]
+
+    async def test(service, client, port):
+        distances = await asyncio.gather(*(client.distance(q) for q in shards))
+        contains = await asyncio.gather(*(client.contains(q) for q in shards))
+        nearest = await client.nearest_edge(shards[2])
+        return distances, contains, nearest, await client.stats()
+
+    distances, contains, nearest, stats = asyncio.run(serve(workspace, obstacles, test))
+    for q, reply, free in zip(shards, distances, contains):
+        distance, polygon, edge, _ = MME565.distance_points_to_polygons(q, [workspace] + obstacles)
+        assert np.allclose(reply["distance"], distance) and reply["polygon"] == polygon.tolist()
+        assert reply["edge"] == edge.tolist()
+        assert free["free"] == MME565.points_in_free_space(q, workspace, obstacles).tolist()
+    assert np.allclose(nearest["closest"], MME565.distance_points_to_polygons(shards[2], [workspace] + obstacles)[3])
+    # concurrent requests of one op share batches
+    assert stats["distance"]["requests"] == len(shards) and stats["distance"]["mean_batch"] > 1
+
+
+def test_malformed_requests(obstacle_grid):
+    workspace, obstacles = obstacle_grid(np.random.default_rng(1), 4)
+    lines = [
+        {"id": 1, "op": "distance", "points": [[1, 2, 3]]},
+        {"id": 2, "op": "contains", "points": [[1, "a"]]},
+        {"id": 3, "op": "distance", "points": [[1, 2], [3, float("nan")]]},
+        {"id": 4, "op": "distance"},
+        {"id": 5, "points": [[1, 2]]},
+        {"id": 6, "op": "area", "points": [[1, 2]]},
+    ]
+
+    async def test(service, client, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for line in lines:
+            writer.write(json.dumps(line).encode() + b"\n")
+        writer.write(b"{not json\n")
+        await writer.drain()
+        replies = [json.loads(await reader.readline()) for _ in range(len(lines) + 1)]
+        writer.close()
+        return {reply["id"]: reply for reply in replies}
+
+    replies = asyncio.run(serve(workspace, obstacles, test))
+    assert "Field 'points'" in replies[1]["error"] and "shape (1, 3)" in replies[1]["error"]
+    assert "Field 'points'" in replies[2]["error"] and "numbers" in replies[2]["error"]
+    assert "Field 'points'" in replies[3]["error"] and "index 1" in replies[3]["error"]
+    assert "Missing field 'points'" in replies[4]["error"]
+    assert "Missing field 'op'" in replies[5]["error"]
+    assert "Field 'op'" in replies[6]["error"] and "'area'" in replies[6]["error"]
+    assert "not valid JSON" in replies[None]["error"]
@@ -0,0 +1,45 @@
+# test_incremental.py
+
+# IncrementalTrapezoidation against a full trapezoidation of the same obstacles after random adds and removes
+
+import MME565
+import numpy as np
+
+
+def covered(trapezoids, q):
+    return MME565.TrapezoidLocator(trapezoids).locate(q) >= 0
+
+
+def test_random_updates_match_full_trapezoidation(obstacle_grid, box_points):
+    rng = np.random.default_rng(0)
+    workspace, obstacles = obstacle_grid(rng, 64)
+    incremental = MME565.IncrementalTrapezoidation(workspace, obstacles[:32])
+    present = set(range(32))
+    ids = dict(zip(range(32), incremental.obstacles))
+    q = box_points(rng, workspace, 4000)
+    for step in range(40):
+        if rng.random() < 0.5 and len(present) < len(obstacles):
+            k = int(rng.choice(sorted(set(range(len(obstacles))) - present)))
+            a, b = obstacles[k].bounding_box[:, 0]
+            before = dict(incremental.trapezoids)
+            ids[k] = incremental.add_obstacle(obstacles[k])
+            present.add(k)
+            # trapezoids clear of the strip are kept as they were
+            for i, trapezoid in before.items():
+                low, high = trapezoid.bounding_box[:, 0]
+                if high <= a or low >= b:
+                    assert incremental.trapezoids[i] is trapezoid
+        else:
+            k = int(rng.choice(sorted(present)))
+            incremental.remove_obstacle(ids.pop(k) if step % 2 else obstacles[k])
+            present.discard(k)
+
+        current = [obstacles[k] for k in sorted(present)]
+        full = MME565.trapezoidation(workspace, current)
+        trapezoids = list(incremental.trapezoids.values())
+        assert np.isclose(sum(t.area for t in trapezoids), sum(t.area for t in full))
+        assert np.array_equal(covered(trapezoids, q), covered(full, q))
+        assert np.array_equal(covered(full, q), MME565.points_in_free_space(q, workspace, current))
+
+    incremental.rebuild()
+    assert len(incremental) == len(MME565.trapezoidation(workspace, [obstacles[k] for k in sorted(present)]))
@@ -0,0 +1,49 @@
+# test_map_file.py
+
+# MapFile save and open round trip
+
+import MME565
+import numpy as np
+import pytest
+
+
+def test_round_trip(obstacle_grid, tmp_path):
+    workspace, obstacles = obstacle_grid(np.random.default_rng(0), 8)
+    obstacles.append(MME565.Polygon([[22, 22], [28, 22], [25, 24], [28, 28], [22, 28]]))  # non-convex, in the empty cell
+    trapezoids = MME565.trapezoidation(workspace, obstacles)
+    file = tmp_path / "map.bin"
+    MME565.MapFile.save(file, workspace, obstacles, trapezoids)
+
+    opened = MME565.MapFile(file)
+    assert opened.num_obstacles == len(obstacles) and opened.num_trapezoids == len(trapezoids)
+    for name in ["polygon_xy", "polygon_start", "vertex_convex", "vertex_types", "trapezoid_xy", "trapezoid_start"]:
+        assert isinstance(opened.arrays[name], np.memmap)
+        assert not opened.arrays[name].flags.writeable
+    assert opened.polygon_xy.ctypes.data % MME565.MapFile.ALIGN == 0
+
+    for original, loaded in zip([workspace] + obstacles, [opened.workspace] + opened.obstacles):
+        # vertex types come from the file, not from classifying the vertices again
+        assert "_classification" in loaded.__dict__
+        assert np.array_equal(loaded.vertex_array, original.vertex_array)
+        assert np.array_equal(loaded.vertex_convex, original.vertex_convex)
+        assert loaded.vertex_types.tolist() == original.vertex_types.tolist()
+    assert not opened.obstacles[-1].vertex_convex.all()
+    for original, loaded in zip(trapezoids, opened.trapezoids):
+        assert np.array_equal(loaded.vertex_array, original.vertex_array)
+
+    in_memory = MME565.MapFile(file, mmap_mode=None)
+    assert not isinstance(in_memory.polygon_xy, np.memmap)
+    assert np.array_equal(in_memory.polygon_xy, opened.polygon_xy)
+
+
+def test_without_trapezoids(tmp_path):
+    workspace = MME565.Polygon([[0, 0], [4, 0], [4, 4], [0, 4]])
+    opened = MME565.MapFile.save(tmp_path / "map.bin", workspace, [])
+    assert opened.num_obstacles == 0 and opened.trapezoids == []
+    assert np.array_equal(opened.workspace.vertex_array, workspace.vertex_array)
+
+
+def test_not_a_map_file(tmp_path):
+    (tmp_path / "other.bin").write_bytes(b"not a map")
+    with pytest.raises(Exception, match="Not a MME565.MapFile"):
+        MME565.MapFile(tmp_path / "other.bin")
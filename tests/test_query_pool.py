@@ -0,0 +1,26 @@
+# test_query_pool.py
+
+# QueryPool results against the serial batch queries they shard across processes
+
+import MME565
+import numpy as np
+
+
+def test_matches_serial_queries(obstacle_grid, box_points):
+    rng = np.random.default_rng(0)
+    workspace, obstacles = obstacle_grid(rng, 25)
+    q = box_points(rng, workspace, 5000, margin=2)
+    distance, polygon, edge, _ = MME565.distance_points_to_polygons(q, [workspace] + obstacles)
+    free = MME565.points_in_free_space(q, workspace, obstacles)
+
+    with MME565.QueryPool(workspace, obstacles, processes=2, shard_size=700, chunk_size=256) as pool:
+        pool_distance, index = pool.distance(q)
+        assert np.array_equal(pool_distance, distance)
+        assert np.array_equal(index, pool.polygon_start[polygon] + edge)
+        assert np.array_equal(pool.contains(q), free)
+
+        # into preallocated arrays, and an empty query
+        out = (np.empty(len(q)), np.empty(len(q), dtype=np.int64))
+        assert pool.distance(q, out=out)[0] is out[0]
+        assert np.array_equal(out[0], distance)
+        assert len(pool.contains(np.empty((0, 2)))) == 0
@@ -0,0 +1,76 @@
+# test_roadmap.py
+
+# Roadmap queries against a plain Dijkstra over the trapezoid adjacency found pair by pair
+
+import MME565
+import numpy as np
+import heapq
+import pytest
+
+
+def brute_force_distances(cells, centers, root):
+    """Dijkstra from trapezoid root, with every pair of trapezoids tested for a shared vertical boundary"""
+    edges = [[] for _ in cells]
+    for i, (_, x1, _, _, bottom1, top1) in enumerate(cells.tolist()):
+        for j, (x0, _, bottom0, top0, _, _) in enumerate(cells.tolist()):
+            low, high = max(bottom1, bottom0), min(top1, top0)
+            if x1 == x0 and low < high:
+                door = np.array([x0, (low + high) / 2])
+                cost = np.linalg.norm(centers[i] - door) + np.linalg.norm(door - centers[j])
+                edges[i].append((j, cost))
+                edges[j].append((i, cost))
+    distance = np.full(len(cells), np.inf)
+    distance[root] = 0.0
+    queue = [(0.0, root)]
+    while queue:
+        d, i = heapq.heappop(queue)
+        if d > distance[i]:
+            continue
+        for j, cost in edges[i]:
+            if d + cost < distance[j]:
+                distance[j] = d + cost
+                heapq.heappush(queue, (d + cost, j))
+    return distance
+
+
+def test_shortest_path_matches_brute_force(obstacle_grid, box_points):
+    rng = np.random.default_rng(0)
+    for n in [1, 4, 9, 25]:
+        workspace, obstacles = obstacle_grid(rng, n)
+        roadmap = MME565.Roadmap(MME565.trapezoidation(workspace, obstacles), cache_size=4)
+        q = box_points(rng, workspace, 160)
+        q = q[MME565.points_in_free_space(q, workspace, obstacles)][:40].reshape(-1, 2, 2)
+        for start, goal in q:
+            a, b = roadmap.locate([start, goal])
+            expected = (
+                np.linalg.norm(start - roadmap.centers[a])
+                + brute_force_distances(roadmap.cells, roadmap.centers, b)[a]
+                + np.linalg.norm(roadmap.centers[b] - goal)
+            )
+            path, length = roadmap.shortest_path(start, goal)
+            assert np.isclose(length, expected)
+            assert np.allclose(path[0], start) and np.allclose(path[-1], goal)
+            assert np.isclose(length, np.sum(np.linalg.norm(np.diff(path, axis=0), axis=1)))
+
+            # the same query again and the reverse query come from cached trees
+            assert np.isclose(roadmap.shortest_path(start, goal)[1], length)
+            assert np.isclose(roadmap.shortest_path(goal, start)[1], length)
+
+
+def test_unreachable_goal_is_rejected_without_search(obstacle_grid):
+    rng = np.random.default_rng(1)
+    workspace, obstacles = obstacle_grid(rng, 4)
+    apart = MME565.Polygon(workspace.vertex_array + [100, 0])
+    trapezoids = MME565.trapezoidation(workspace, obstacles) + MME565.trapezoidation(apart, [])
+    roadmap = MME565.Roadmap(trapezoids)
+    assert len(set(roadmap.components.tolist())) == 2
+    assert roadmap.shortest_path([1, 1], [101, 1]) == (None, np.inf)
+    assert len(roadmap._trees) == 0
+    assert roadmap.shortest_path([101, 1], [119, 19])[0] is not None
+
+
+def test_outside_start(obstacle_grid):
+    workspace, obstacles = obstacle_grid(np.random.default_rng(2), 4)
+    roadmap = MME565.Roadmap(MME565.trapezoidation(workspace, obstacles))
+    with pytest.raises(Exception, match="inside"):
+        roadmap.shortest_path([-1, -1], [5, 5])
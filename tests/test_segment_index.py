@@ -0,0 +1,57 @@
+# test_segment_index.py
+
+# SegmentIndex queries against the exact distance from every query point to every segment
+
+import MME565
+import numpy as np
+import pytest
+
+
+def brute_force(index, q):
+    """(N, M) exact distances from the points to all segments of the index, by the clamped orthogonal projection"""
+    p1, p2 = index.segments.p1, index.segments.p2
+    d = p2 - p1
+    t = np.clip(np.sum((q[:, np.newaxis] - p1) * d, axis=-1) / np.sum(d * d, axis=-1), 0, 1)
+    return np.hypot(*np.moveaxis(q[:, np.newaxis] - p1 - t[..., np.newaxis] * d, -1, 0))
+
+
+@pytest.fixture
+def index_and_points(obstacle_grid, box_points):
+    rng = np.random.default_rng(0)
+    workspace, obstacles = obstacle_grid(rng, 100)
+    index = MME565.SegmentIndex(workspace, obstacles)
+    q = np.round(box_points(rng, workspace, 300, margin=5), 8)
+    return index, q, brute_force(index, q)
+
+
+def test_nearest(index_and_points):
+    index, q, expected = index_and_points
+    distance, nearest, closest = index.nearest(q)
+    assert np.allclose(distance, expected.min(axis=1), rtol=0, atol=1e-7)
+    assert np.allclose(expected[np.arange(len(q)), nearest], distance, rtol=0, atol=1e-7)
+    assert np.allclose(np.hypot(*(q - closest).T), distance, rtol=0, atol=1e-7)
+
+
+def test_k_nearest(index_and_points):
+    index, q, expected = index_and_points
+    distance, nearest = index.k_nearest(q, 5)
+    assert np.allclose(distance, np.sort(expected, axis=1)[:, :5], rtol=0, atol=1e-7)
+    assert np.allclose(np.take_along_axis(expected, nearest, axis=1), distance, rtol=0, atol=1e-7)
+
+
+def test_within(index_and_points):
+    index, q, expected = index_and_points
+    radius = 4.0
+    for (found, distance), row in zip(index.within(q, radius), expected):
+        assert set(found.tolist()) == set(np.flatnonzero(row <= radius).tolist())
+        assert np.allclose(distance, row[found], rtol=0, atol=1e-7)
+        assert np.all(np.diff(distance) >= 0)
+
+
+def test_interior_projection_is_nearest():
+    # the nearest edge here was once lost to an endpoint distance of 1.465 for the true distance of 0.235
+    workspace = MME565.Polygon([[0, 0], [100, 0], [100, 100], [0, 100]])
+    obstacle = MME565.Polygon([[47.60978106, 75.06646226], [45.4731835, 77.33256732], [44, 74]])
+    distance, nearest, _ = MME565.SegmentIndex(workspace, [obstacle]).nearest([[46.29437681, 76.11902894]])
+    assert abs(distance[0] - 0.23500606) < 1e-7
+    assert nearest[0] == 4
@@ -0,0 +1,105 @@
+# test_segment_intersections.py
+
+# segment_intersections and polygon_intersections against an exact pairwise test of every segment pair
+
+import MME565
+import numpy as np
+import pytest
+
+
+def brute_force(p1, p2, following=None):
+    """Every pair of closed segments that meet, from the exact orientation of each end against the other segment"""
+    i, j = np.triu_indices(len(p1), 1)
+    if following is not None:
+        consecutive = (following[i] == j) | (following[j] == i)
+        i, j = i[~consecutive], j[~consecutive]
+    a, b, c, d = p1[i], p2[i], p1[j], p2[j]
+    o1, o2 = MME565.orientations(a, b, c), MME565.orientations(a, b, d)
+    o3, o4 = MME565.orientations(c, d, a), MME565.orientations(c, d, b)
+
+    def within(p, q, r):
+        """r is in the bounding box of p and q"""
+        return np.all((np.minimum(p, q) <= r) & (r <= np.maximum(p, q)), axis=1)
+
+    meet = (
+        ((o1 * o2 < 0) & (o3 * o4 < 0))
+        | ((o1 == 0) & within(a, b, c)) | ((o2 == 0) & within(a, b, d))
+        | ((o3 == 0) & within(c, d, a)) | ((o4 == 0) & within(c, d, b))
+    )
+    return set(zip(i[meet].tolist(), j[meet].tolist()))
+
+
+def found(pairs):
+    return set(map(tuple, pairs.tolist()))
+
+
+@pytest.mark.parametrize("offset", [0.0, 5e6])
+def test_random_segments(offset):
+    rng = np.random.default_rng(0)
+    for n, spread in [(50, 50.0), (300, 10.0), (1000, 5.0)]:
+        p1 = offset + rng.uniform(0, 100, (n, 2))
+        p2 = p1 + rng.normal(0, spread, (n, 2))
+        pairs, points = MME565.segment_intersections(p1, p2)
+        assert found(pairs) == brute_force(p1, p2)
+        assert len(points) == len(pairs)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_segment_soups(seed):
+    # endpoints on a small integer grid, so shared endpoints, collinear overlaps, T-junctions and vertical segments
+    # are common
+    rng = np.random.default_rng(seed)
+    p1 = rng.integers(0, 8, (200, 2)).astype(float)
+    p2 = rng.integers(0, 8, (200, 2)).astype(float)
+    keep = np.any(p1 != p2, axis=1)
+    p1, p2 = p1[keep], p2[keep]
+    # segments lying along each other on one line, and a fan sharing one endpoint
+    t = np.array([[0, 3], [1, 2], [2, 5], [5, 6], [6, 7]], dtype=float)
+    direction = np.array([1.0, 1.0]) if seed % 2 else np.array([0.0, 1.0])
+    fan = rng.integers(0, 8, (8, 2)).astype(float)
+    fan = fan[np.any(fan != 4, axis=1)]
+    p1 = np.concatenate([p1, t[:, :1] * direction, np.full((len(fan), 2), 4.0)])
+    p2 = np.concatenate([p2, t[:, 1:] * direction, fan])
+    pairs, points = MME565.segment_intersections(p1, p2)
+    assert found(pairs) == brute_force(p1, p2)
+    assert set(MME565._sweep_intersections(p1, p2, np.full(len(p1), -1))) == brute_force(p1, p2)
+    for (i, j), point in zip(pairs.tolist(), points):
+        assert MME565.point_on_segment(point, p1[i], p2[i], 1e-9) and MME565.point_on_segment(point, p1[j], p2[j], 1e-9)
+
+
+def test_sweep_without_pruning():
+    rng = np.random.default_rng(1)
+    p1 = rng.uniform(0, 100, (400, 2))
+    p2 = p1 + rng.normal(0, 20, (400, 2))
+    assert set(MME565._sweep_intersections(p1, p2, np.full(400, -1))) == brute_force(p1, p2)
+
+
+@pytest.mark.parametrize("offset", [0.0, 5e6])
+def test_random_polygons(offset):
+    rng = np.random.default_rng(2)
+    for n in [5, 20, 80]:
+        polygons = [MME565.Polygon(offset + rng.uniform(0, 100, (n, 2))) for _ in range(3)]
+        sizes = [polygon.num_sides for polygon in polygons]
+        starts = np.cumsum(sizes) - sizes
+        p1 = np.concatenate([polygon.vertex_array for polygon in polygons])
+        following = np.concatenate([start + (np.arange(size) + 1) % size for start, size in zip(starts, sizes)])
+        expected = brute_force(p1, p1[following], following)
+        crossings = MME565.polygon_intersections(polygons)
+        assert {(starts[i] + a, starts[j] + b) for (i, a), (j, b), _ in crossings} == expected
+
+
+def test_obstacle_grid_has_no_intersections(obstacle_grid):
+    workspace, obstacles = obstacle_grid(np.random.default_rng(3), 400)
+    assert MME565.polygon_intersections([workspace] + obstacles) == []
+
+
+def test_large_coordinates():
+    # squares 1 mm apart at UTM-like coordinates do not intersect, touching ones do
+    x, y = 512345.0, 5012345.0
+    square = lambda x0, y0: MME565.Polygon([[x0, y0], [x0 + 10, y0], [x0 + 10, y0 + 10], [x0, y0 + 10]])
+    assert MME565.polygon_intersections([square(x, y), square(x + 10.001, y), square(x, y + 10.001)]) == []
+    crossings = MME565.polygon_intersections([square(x, y), square(x + 10, y + 5)])
+    assert {(i, j) for (i, _), (j, _), _ in crossings} == {(0, 1)}
+    MME565.Polygon(square(x, y).vertex_array, validate=True)
+    with pytest.raises(Exception, match="intersecting"):
+        MME565.Polygon([[x, y], [x + 10, y + 10], [x + 10, y], [x, y + 10]], validate=True)
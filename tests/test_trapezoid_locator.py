@@ -0,0 +1,52 @@
+# test_trapezoid_locator.py
+
+# TrapezoidLocator against a scan over every trapezoid, the first one containing the point winning
+
+import MME565
+import numpy as np
+
+
+def scan(cells, q, tolerance=1e-9):
+    x0, x1, bottom0, top0, bottom1, top1 = cells.T
+    x, y = q[:, 0:1], q[:, 1:2]
+    t = (x - x0) / (x1 - x0)
+    inside = (
+        (x >= x0) & (x <= x1)
+        & (y >= bottom0 + t * (bottom1 - bottom0) - tolerance) & (y <= top0 + t * (top1 - top0) + tolerance)
+    )
+    return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+
+def boundary_points(trapezoids):
+    """Vertices, side midpoints and top and bottom edge midpoints of every trapezoid"""
+    points = []
+    for trapezoid in trapezoids:
+        vertices = trapezoid.vertex_array
+        points.append(vertices)
+        points.append((vertices + np.roll(vertices, -1, axis=0)) / 2)
+    return np.concatenate(points)
+
+
+def test_locate_matches_scan(obstacle_grid, box_points):
+    rng = np.random.default_rng(0)
+    for n in [1, 9, 50]:
+        workspace, obstacles = obstacle_grid(rng, n)
+        trapezoids = MME565.trapezoidation(workspace, obstacles)
+        locator = MME565.TrapezoidLocator(trapezoids)
+        q = np.concatenate([box_points(rng, workspace, 2000, margin=1), boundary_points(trapezoids)])
+        expected = scan(locator.cells, q)
+        assert np.array_equal(locator.locate(q), expected)
+        assert np.array_equal(np.concatenate([locator.locate(point) for point in q]), expected)
+
+
+def test_shared_edges_take_lowest_index():
+    # two trapezoids side by side and one on top of the right one
+    trapezoids = [
+        MME565.Trapezoid([[1, 0], [2, 0], [2, 1], [1, 1]]),
+        MME565.Trapezoid([[0, 0], [1, 0], [1, 2], [0, 2]]),
+        MME565.Trapezoid([[1, 1], [2, 1], [2, 2], [1, 2]]),
+    ]
+    locator = MME565.TrapezoidLocator(trapezoids)
+    q = np.array([[1, 0.5], [1, 1.5], [1.5, 1], [1, 1], [0.5, 0.5], [2, 2], [3, 1]] * 2, dtype=float)
+    assert locator.locate(q).tolist() == [0, 1, 0, 0, 1, 2, -1] * 2
+    assert [int(locator.locate(point)[0]) for point in q[:7]] == [0, 1, 0, 0, 1, 2, -1]
@@ -0,0 +1,60 @@
+# test_trapezoidation.py
+
+# trapezoidation against the free space it decomposes: the trapezoids add up to the free area and cover exactly the
+# points in free space
+
+import MME565
+import numpy as np
+import pytest
+
+
+def rectangle(x0, y0, x1, y1):
+    return MME565.Polygon([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+
+
+def check(workspace, obstacles, q):
+    trapezoids = MME565.trapezoidation(workspace, obstacles)
+    free_area = abs(workspace.area) - sum(abs(obstacle.area) for obstacle in obstacles)
+    assert np.isclose(sum(trapezoid.area for trapezoid in trapezoids), free_area)
+    covered = MME565.TrapezoidLocator(trapezoids).locate(q) >= 0
+    assert np.array_equal(covered, MME565.points_in_free_space(q, workspace, obstacles))
+    return trapezoids
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_obstacle_grid(seed, obstacle_grid, box_points):
+    rng = np.random.default_rng(seed)
+    workspace, obstacles = obstacle_grid(rng, 50)
+    check(workspace, obstacles, box_points(rng, workspace, 3000, margin=1))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_non_convex_workspace(seed, star_polygon, box_points):
+    rng = np.random.default_rng(seed)
+    workspace = MME565.Polygon(star_polygon(rng, 40))
+    obstacles = [
+        MME565.Polygon([[40, 45], [48, 42], [44, 52]]), MME565.Polygon([[52, 50], [60, 52], [55, 58], [54, 53]])
+    ]
+    check(workspace, obstacles, box_points(rng, workspace, 3000, margin=1))
+
+
+def test_clockwise_polygons(box_points):
+    # the same map with every ring given clockwise
+    workspace = MME565.Polygon([[0, 0], [0, 20], [10, 12], [20, 20], [20, 0]])
+    obstacles = [MME565.Polygon([[3, 3], [4, 7], [7, 5]]), MME565.Polygon([[12, 3], [13, 7], [16, 4]])]
+    q = box_points(np.random.default_rng(0), workspace, 3000)
+    clockwise = check(workspace, obstacles, q)
+    counter_clockwise = check(
+        MME565.Polygon(workspace.vertex_array[::-1]), [MME565.Polygon(o.vertex_array[::-1]) for o in obstacles], q
+    )
+    assert len(clockwise) == len(counter_clockwise)
+
+
+def test_vertical_edges_and_shared_event_x(box_points):
+    # an L-shaped workspace and rectangles stacked in columns, so most events share an x with others and every
+    # obstacle has vertical sides, some of them level with a workspace vertex
+    workspace = MME565.Polygon([[0, 0], [30, 0], [30, 10], [10, 10], [10, 30], [0, 30]])
+    obstacles = [rectangle(2, 2 + 6 * k, 4, 5 + 6 * k) for k in range(4)]
+    obstacles += [rectangle(10, 2, 14, 4), rectangle(10, 6, 12, 8), rectangle(20, 2, 24, 8)]
+    obstacles += [MME565.Polygon([[5, 12], [8, 12], [5, 16]]), MME565.Polygon([[5, 20], [8, 24], [5, 24]])]
+    check(workspace, obstacles, box_points(np.random.default_rng(1), workspace, 4000, margin=1))
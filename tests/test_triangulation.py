@@ -0,0 +1,60 @@
+# test_triangulation.py
+
+# Triangulation against a brute-force point in triangle count and the free space of the input polygons
+
+import MME565
+import numpy as np
+import pytest
+
+
+def containing_triangles(triangulation, q):
+    """Number of triangles strictly containing each point, every triangle tested"""
+    a, b, c = (triangulation.vertices[triangulation.triangles[:, k]] for k in range(3))
+    inside = np.ones((len(q), len(a)), dtype=bool)
+    for p0, p1 in [(a, b), (b, c), (c, a)]:
+        cross = (p1[:, 0] - p0[:, 0]) * (q[:, 1:2] - p0[:, 1]) - (p1[:, 1] - p0[:, 1]) * (q[:, 0:1] - p0[:, 0])
+        inside &= cross > 1e-9
+    return inside.sum(axis=1)
+
+
+def random_map(seed, obstacle_grid, star_polygon):
+    rng = np.random.default_rng(seed)
+    if seed % 2:
+        return obstacle_grid(rng, int(rng.integers(1, 60)))
+    workspace = MME565.Polygon(star_polygon(rng, int(rng.integers(3, 80))))
+    obstacles = [MME565.Polygon([[45, 45], [55, 47], [50, 54]])] if seed % 4 else []
+    return workspace, obstacles
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_random_maps(seed, obstacle_grid, star_polygon, box_points):
+    workspace, obstacles = random_map(seed, obstacle_grid, star_polygon)
+    triangulation = MME565.Triangulation(workspace, obstacles)
+    n = len(triangulation.vertices)
+    assert len(triangulation) == n + 2 * len(obstacles) - 2
+    assert np.all(triangulation.areas > 0)
+    assert np.isclose(triangulation.areas.sum(), workspace.area - sum(obstacle.area for obstacle in obstacles))
+
+    # each free point is in exactly one triangle, each point in an obstacle or outside the workspace in none
+    q = box_points(np.random.default_rng(seed), workspace, 2000)
+    count = containing_triangles(triangulation, q)
+    free = MME565.points_in_free_space(q, workspace, obstacles)
+    assert np.all(count[free] == 1)
+    assert np.all(count[~free] == 0)
+
+    # neighbors are mutual and share the edge opposite the corner
+    for t, row in enumerate(triangulation.neighbors.tolist()):
+        for corner, u in enumerate(row):
+            if u >= 0:
+                assert t in triangulation.neighbors[u]
+                edge = {triangulation.triangles[t, (corner + 1) % 3], triangulation.triangles[t, (corner + 2) % 3]}
+                assert edge <= set(triangulation.triangles[u].tolist())
+
+
+def test_monotone_face_chains():
+    # a face whose chains interleave in x, triangulated into n - 2 triangles covering its area
+    xy = [[0, 0], [1, -1], [3, -1], [6, 0], [5, 1], [4, 2], [2, 1]]
+    triangles = MME565._triangulate_monotone(list(range(len(xy))), xy)
+    assert len(triangles) == len(xy) - 2
+    area = sum(abs(MME565._signed_area(np.array([xy[v] for v in triangle]))) for triangle in triangles)
+    assert np.isclose(area, abs(MME565._signed_area(np.array(xy, dtype=float))))
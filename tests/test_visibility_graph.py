@@ -0,0 +1,161 @@
+# test_visibility_graph.py
+
+# VisibilityGraph paths against a Dijkstra over every polygon vertex, with each pair tested for visibility exactly
+
+from fractions import Fraction
+import heapq
+
+import MME565
+import numpy as np
+import pytest
+
+
+def sign(x):
+    return (x > 0) - (x < 0)
+
+
+def turn(p, q, r):
+    return sign((q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0]))
+
+
+def on_edge(p, a, b):
+    within = min(a[0], b[0]) <= p[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= p[1] <= max(a[1], b[1])
+    return within and turn(a, b, p) == 0
+
+
+def inside(p, ring):
+    """Even-odd test of a point that is not on the boundary of the ring"""
+    crossings = 0
+    for a, b in zip(ring, ring[1:] + ring[:1]):
+        if (a[1] > p[1]) != (b[1] > p[1]) and turn(a, b, p) * sign(b[1] - a[1]) > 0:
+            crossings += 1
+    return crossings % 2 == 1
+
+
+class Oracle:
+    """Exact visibility in the closed free space, on coordinates that are multiples of 1/4 (kept as fractions)"""
+    def __init__(self, workspace, obstacles):
+        self.rings = [[(Fraction(x), Fraction(y)) for x, y in polygon.vertex_array.tolist()]
+                      for polygon in [workspace] + list(obstacles)]
+        self.vertices = [v for ring in self.rings for v in ring]
+        self.edges = [(a, b) for ring in self.rings for a, b in zip(ring, ring[1:] + ring[:1])]
+
+    def free(self, p):
+        if any(on_edge(p, a, b) for a, b in self.edges):
+            return True
+        return inside(p, self.rings[0]) and not any(inside(p, ring) for ring in self.rings[1:])
+
+    def strictly_free(self, p):
+        return not any(on_edge(p, a, b) for a, b in self.edges) and self.free(p)
+
+    def visible(self, u, v):
+        if u == v:
+            return True
+        for a, b in self.edges:
+            if turn(u, v, a) * turn(u, v, b) < 0 and turn(a, b, u) * turn(a, b, v) < 0:
+                return False
+        # without proper crossings the segment can only enter or leave the free space at a vertex on it
+        d = (v[0] - u[0], v[1] - u[1])
+        t = sorted({(w[0] - u[0]) * d[0] + (w[1] - u[1]) * d[1] for w in self.vertices if turn(u, v, w) == 0})
+        norm = d[0] * d[0] + d[1] * d[1]
+        t = [0] + [s / norm for s in t if 0 < s < norm] + [1]
+        return all(self.free((u[0] + (s + e) / 2 * d[0], u[1] + (s + e) / 2 * d[1])) for s, e in zip(t, t[1:]))
+
+    def graph(self):
+        n = len(self.vertices)
+        return [[j for j in range(n) if j != i and self.visible(self.vertices[i], self.vertices[j])] for i in range(n)]
+
+    def shortest_length(self, graph, start, goal):
+        points = self.vertices + [start, goal]
+        s, g = len(self.vertices), len(self.vertices) + 1
+        if self.visible(start, goal):
+            return float(np.hypot(float(goal[0] - start[0]), float(goal[1] - start[1])))
+        edges = [list(row) for row in graph] + [[], []]
+        for end in (s, g):
+            for i, v in enumerate(self.vertices):
+                if self.visible(points[end], v):
+                    edges[end].append(i)
+                    edges[i].append(end)
+        distance = [np.inf] * len(points)
+        distance[s] = 0.0
+        queue = [(0.0, s)]
+        while queue:
+            d, i = heapq.heappop(queue)
+            if d > distance[i]:
+                continue
+            for j in edges[i]:
+                step = float(np.hypot(float(points[j][0] - points[i][0]), float(points[j][1] - points[i][1])))
+                if d + step < distance[j]:
+                    distance[j] = d + step
+                    heapq.heappush(queue, (d + step, j))
+        return distance[g]
+
+
+def ring(vertices, clockwise):
+    return MME565.Polygon(vertices[::-1] if clockwise else vertices)
+
+
+def rectangle(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def aligned_map(rng):
+    """Square obstacles in rows that share their top and bottom lines, with a vertex in the middle of some edges"""
+    workspace = MME565.Polygon([[0, 0], [20, 0], [40, 0], [40, 40], [0, 40]])
+    obstacles = [
+        rectangle(5, 10, 10, 15), rectangle(15, 10, 20, 15), rectangle(25, 10, 30, 15),
+        [[5, 25], [10, 25], [10, 30], [7.5, 30], [5, 30]], [[15, 20], [20, 20], [20, 25], [20, 30], [15, 30]],
+        [[25, 25], [35, 25], [30, 30]],
+    ]
+    return workspace, [ring(o, k % 2 == 1) for k, o in enumerate(obstacles)]
+
+
+def comb_map(rng):
+    """Non-convex, clockwise workspace whose teeth line up with the obstacle corners"""
+    workspace = [[0, 0], [40, 0], [40, 40], [30, 40], [30, 20], [20, 20], [20, 40], [10, 40], [10, 20], [0, 20]]
+    obstacles = [rectangle(5, 5, 10, 10), rectangle(20, 5, 25, 10), [[30, 5], [35, 10], [30, 15]]]
+    return MME565.Polygon(workspace[::-1]), [ring(o, k % 2 == 0) for k, o in enumerate(obstacles)]
+
+
+def random_rectangles(rng):
+    """Rectangles with integer corners in a 3 x 3 grid of cells, each ring in a random orientation"""
+    workspace = MME565.Polygon(rectangle(0, 0, 30, 30))
+    obstacles = []
+    for i in range(3):
+        for j in range(3):
+            x0, y0 = 10 * i + rng.integers(1, 4), 10 * j + rng.integers(1, 4)
+            corners = rectangle(x0, y0, x0 + rng.integers(2, 6), y0 + rng.integers(2, 6))
+            obstacles.append(ring(corners, rng.random() < 0.5))
+    return workspace, obstacles
+
+
+MAPS = [(aligned_map, 0), (comb_map, 1), (random_rectangles, 2), (random_rectangles, 3)]
+
+
+@pytest.mark.parametrize("make_map, seed", MAPS)
+def test_shortest_path_matches_pairwise_visibility(make_map, seed):
+    rng = np.random.default_rng(seed)
+    workspace, obstacles = make_map(rng)
+    graph = MME565.VisibilityGraph(workspace, obstacles)
+    oracle = Oracle(workspace, obstacles)
+    vertex_graph = oracle.graph()
+
+    (x0, y0), (x1, y1) = workspace.bounding_box
+    q = rng.integers([4 * x0, 4 * y0], [4 * x1 + 1, 4 * y1 + 1], (400, 2)) / 4
+    q = [p for p in q.tolist() if oracle.strictly_free((Fraction(p[0]), Fraction(p[1])))]
+    assert np.all(MME565.points_in_free_space(q, workspace, obstacles))
+    for start, goal in zip(q[:20], q[20:40]):
+        expected = oracle.shortest_length(vertex_graph, *[(Fraction(x), Fraction(y)) for x, y in (start, goal)])
+        path, length = graph.shortest_path(start, goal)
+        assert np.isclose(length, expected)
+        assert np.allclose(path[0], start) and np.allclose(path[-1], goal)
+        assert np.isclose(length, np.sum(np.linalg.norm(np.diff(path, axis=0), axis=1)))
+        waypoints = [(Fraction(x), Fraction(y)) for x, y in path.tolist()]
+        assert all(oracle.visible(u, v) for u, v in zip(waypoints, waypoints[1:]))
+
+
+def test_start_outside_free_space_is_rejected():
+    workspace, obstacles = aligned_map(None)
+    graph = MME565.VisibilityGraph(workspace, obstacles)
+    with pytest.raises(Exception, match="free workspace"):
+        graph.shortest_path([7, 12], [1, 1])